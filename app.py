@@ -1,3 +1,4 @@
+import hmac
 import json
 import os
 import re
@@ -7,12 +8,63 @@ import time
 import traceback
 import signal
 import threading
-from datetime import datetime
+from datetime import datetime, timezone
 from functools import wraps
 from flask import Flask, request, jsonify
 from flask_restful import Api, Resource
 import shlex
 import pathlib
+from app_logging import (
+    get_logger,
+    job_id_var,
+    new_job_id,
+    set_job,
+    setup_logging,
+    tail,
+)
+from app_responses import compress_response, output_json
+from app_usage import (
+    GROUP_KEYS,
+    add_cli_usage,
+    add_phase_time,
+    annotate_job,
+    api_key_fingerprint,
+    begin_job,
+    finish_job,
+    ledger,
+)
+
+# Log structured JSON through a background queue so request threads never
+# block on log I/O
+setup_logging()
+logger = get_logger("app")
+
+# Paths to the entrypoint script, the Claude CLI and the directories they use.
+# These default to the container layout but can be overridden from the
+# environment, e.g. to point at the stub CLI used by the benchmark suite.
+ENTRYPOINT_PATH = os.environ.get("ENTRYPOINT_PATH", "/entrypoint.sh")
+CLAUDE_CLI_PATH = os.environ.get(
+    "CLAUDE_CLI_PATH", "/usr/local/lib/node_modules/@anthropic-ai/claude-code/cli.js"
+)
+CLAUDE_CONFIG_DIR = os.environ.get("CLAUDE_CONFIG_DIR", "/home/node/.claude")
+SSH_DIR = os.environ.get("SSH_DIR", "/home/node/.ssh")
+
+# Node's on-disk compile cache for the CLI (Node 22+). Every job starts a
+# fresh Node process, so caching the compiled cli.js saves startup time on
+# every run. Set NODE_COMPILE_CACHE to an empty string to disable it.
+NODE_COMPILE_CACHE = os.environ.get(
+    "NODE_COMPILE_CACHE", "/home/node/.cache/node-compile-cache"
+)
+
+# Readiness probing: how often to refresh the cached probe results (seconds,
+# 0 probes once at startup and never refreshes) and how long a single probe
+# may take
+READINESS_INTERVAL = float(os.environ.get("READINESS_INTERVAL", "60"))
+PROBE_TIMEOUT = float(os.environ.get("PROBE_TIMEOUT", "30"))
+
+# Bearer token that may read the usage of every API key. Without it, callers
+# only see the usage of the Anthropic API key they send.
+USAGE_ADMIN_TOKEN = os.environ.get("USAGE_ADMIN_TOKEN", "")
 
 # Create a dictionary to track running processes
 running_processes = {}
@@ -20,31 +72,201 @@ running_processes = {}
 
 # Signal handler for graceful shutdown
 def handle_sigterm(signum, frame):
-    print("Received SIGTERM signal. Starting graceful shutdown...")
+    logger.info("Received SIGTERM signal. Starting graceful shutdown...")
     # Terminate any running subprocesses
     for pid, process in running_processes.items():
         try:
-            print(f"Terminating subprocess with PID {pid}")
+            logger.info(f"Terminating subprocess with PID {pid}")
             process.terminate()
             # Give it some time to terminate gracefully
             process.wait(timeout=30)
         except subprocess.TimeoutExpired:
-            print(f"Subprocess {pid} did not terminate in time, killing it")
+            logger.warning(f"Subprocess {pid} did not terminate in time, killing it")
             process.kill()
         except Exception as e:
-            print(f"Error terminating subprocess {pid}: {e}")
+            logger.error(f"Error terminating subprocess {pid}: {e}")
 
     # Let the main process exit naturally
-    print("Graceful shutdown complete")
+    logger.info("Graceful shutdown complete")
     sys.exit(0)
 
 
 # Register the signal handler
 signal.signal(signal.SIGTERM, handle_sigterm)
 
+
+def enable_cli_compile_cache():
+    """
+    Turn on Node's compile cache for every CLI process started by this app
+    """
+    if not NODE_COMPILE_CACHE:
+        os.environ.pop("NODE_COMPILE_CACHE", None)
+        return
+    try:
+        os.makedirs(NODE_COMPILE_CACHE, exist_ok=True)
+        if not os.access(NODE_COMPILE_CACHE, os.W_OK):
+            raise PermissionError(f"{NODE_COMPILE_CACHE} is not writable")
+    except OSError as e:
+        logger.warning(f"Disabling the Node compile cache: {e}")
+        # Do not leave a cache path from the image in the environment
+        os.environ.pop("NODE_COMPILE_CACHE", None)
+        return
+    # Child processes inherit the environment, including entrypoint.sh
+    os.environ["NODE_COMPILE_CACHE"] = NODE_COMPILE_CACHE
+
+
+def compile_cache_status():
+    """
+    Whether the compile cache handed to CLI processes is a usable directory
+    """
+    path = os.environ.get("NODE_COMPILE_CACHE")
+    if not path:
+        return {"ok": False, "path": None}
+    return {
+        "ok": os.path.isdir(path) and os.access(path, os.W_OK),
+        "path": path,
+    }
+
+
+# Cached readiness probe results, refreshed by the background prober
+readiness = {"checked_at": None, "checks": {}, "cli_spawn": {}}
+readiness_lock = threading.Lock()
+
+
+def timed_run(cmd, env=None):
+    """
+    Run a probe command with a timeout and return (ok, elapsed ms, output)
+    """
+    start = time.monotonic()
+    try:
+        result = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            timeout=PROBE_TIMEOUT,
+            env=env,
+        )
+        ok = result.returncode == 0
+        output = result.stdout.strip()
+    except subprocess.TimeoutExpired:
+        ok = False
+        output = f"Timed out after {PROBE_TIMEOUT} seconds"
+    except OSError as e:
+        ok = False
+        output = str(e)
+    return ok, round((time.monotonic() - start) * 1000, 1), output[-200:]
+
+
+def measure_cli_spawn():
+    """
+    Time one CLI spawn without the compile cache and one with the populated
+    cache, to show how much of the per-job overhead the cache saves
+    """
+    uncached_env = {k: v for k, v in os.environ.items() if k != "NODE_COMPILE_CACHE"}
+    cold_ok, cold_ms, _ = timed_run([CLAUDE_CLI_PATH, "--version"], env=uncached_env)
+    spawn = {"cold_no_cache_ms": cold_ms if cold_ok else None, "warm_cache_ms": None}
+    if compile_cache_status()["ok"]:
+        # The readiness check just ran with the cache, so it is populated
+        warm_ok, warm_ms, _ = timed_run([CLAUDE_CLI_PATH, "--version"])
+        spawn["warm_cache_ms"] = warm_ms if warm_ok else None
+    return spawn
+
+
+def run_readiness_probes():
+    """
+    Check that the CLI, git and the Claude config directory are usable and
+    store the results for /ready
+    """
+    cli_ok, cli_ms, cli_output = timed_run([CLAUDE_CLI_PATH, "--version"])
+    git_ok, git_ms, git_output = timed_run(["git", "--version"])
+    config_ok = os.path.isdir(CLAUDE_CONFIG_DIR) and os.access(
+        CLAUDE_CONFIG_DIR, os.W_OK
+    )
+
+    # Spawn latency only changes with the image, so measure it once
+    with readiness_lock:
+        cli_spawn = dict(readiness["cli_spawn"])
+    if cli_ok and "cold_no_cache_ms" not in cli_spawn:
+        cli_spawn.update(measure_cli_spawn())
+    cli_spawn["compile_cache"] = compile_cache_status()
+
+    with readiness_lock:
+        readiness["checked_at"] = datetime.now(timezone.utc).isoformat()
+        readiness["checks"] = {
+            "cli": {"ok": cli_ok, "elapsed_ms": cli_ms, "output": cli_output},
+            "git": {"ok": git_ok, "elapsed_ms": git_ms, "output": git_output},
+            "config_dir": {"ok": config_ok, "path": CLAUDE_CONFIG_DIR},
+        }
+        readiness["cli_spawn"] = cli_spawn
+
+
+def readiness_prober():
+    """
+    Background loop that keeps the readiness results fresh
+    """
+    while True:
+        try:
+            run_readiness_probes()
+        except Exception:
+            logger.exception("Readiness probe failed")
+        if READINESS_INTERVAL <= 0:
+            # Periodic refresh is disabled; keep the startup results
+            return
+        time.sleep(READINESS_INTERVAL)
+
+
+def start_readiness_prober():
+    """
+    Start the background readiness prober. With READINESS_INTERVAL <= 0 it
+    probes once at startup and then stops.
+    """
+    thread = threading.Thread(target=readiness_prober, name="readiness-prober")
+    thread.daemon = True
+    thread.start()
+
+
+enable_cli_compile_cache()
+start_readiness_prober()
+
 app = Flask(__name__)
 api = Api(app)
 
+# Serialize API responses compactly, with field selection and truncated
+# diagnostics (logged in full under the job id), and compress every response the client accepts compressed
+api.representations["application/json"] = output_json
+app.after_request(compress_response)
+
+
+@app.before_request
+def start_job():
+    """
+    Tag every log record of this request with a job id, and track the usage
+    of jobs submitted to the API
+    """
+    # The job id keys the logs and the usage ledger, so it is always
+    # generated here; a client's X-Request-Id is only logged
+    job_id = new_job_id()
+    set_job(
+        job_id=job_id,
+        phase="request",
+        request_id=request.headers.get("X-Request-Id", ""),
+    )
+    if request.method == "POST" and request.path.startswith("/api/"):
+        begin_job(job_id, request.path.rsplit("/", 1)[-1])
+
+
+@app.after_request
+def add_job_id_header(response):
+    """
+    Return the job id so clients can find the logs of their request
+    """
+    job_id = job_id_var.get()
+    if job_id:
+        response.headers["X-Job-Id"] = job_id
+    finish_job(response.status_code)
+    return response
+
 
 @app.route("/")
 def index():
@@ -77,6 +299,16 @@ def index():
                     "method": "POST",
                     "description": "Break down epics into user stories",
                 },
+                {
+                    "path": "/api/usage",
+                    "method": "GET",
+                    "description": "Cost, token and latency totals per API key, repository and endpoint",
+                },
+                {
+                    "path": "/api/usage/jobs/<job_id>",
+                    "method": "GET",
+                    "description": "Cost, token and latency record of a single job",
+                },
             ],
         }
     )
@@ -90,48 +322,76 @@ def health():
     return jsonify({"status": "ok"})
 
 
+@app.route("/ready")
+def ready():
+    """
+    Readiness endpoint reporting the cached results of the background
+    probes. It never spawns a process itself.
+    """
+    with readiness_lock:
+        checks = dict(readiness["checks"])
+        cli_spawn = dict(readiness["cli_spawn"])
+        checked_at = readiness["checked_at"]
+
+    if checked_at is None:
+        return jsonify({"status": "starting", "checks": {}}), 503
+
+    is_ready = all(check["ok"] for check in checks.values())
+    return (
+        jsonify(
+            {
+                "status": "ready" if is_ready else "not ready",
+                "checked_at": checked_at,
+                "checks": checks,
+                "cli_spawn": cli_spawn,
+                "refresh_interval_seconds": (
+                    READINESS_INTERVAL if READINESS_INTERVAL > 0 else None
+                ),
+            }
+        ),
+        200 if is_ready else 503,
+    )
+
+
 @app.route("/test-claude", methods=["GET"])
 def test_claude():
     """
-    Test endpoint to directly test the Claude CLI
+    Test endpoint reporting the cached result of the background CLI probe.
+    It never spawns a process itself.
     """
-    try:
-        # Run a simple Claude CLI command
-        result = subprocess.run(
-            ["/usr/local/lib/node_modules/@anthropic-ai/claude-code/cli.js", "--help"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
-
-        return jsonify(
+    with readiness_lock:
+        cli = readiness["checks"].get("cli")
+        checked_at = readiness["checked_at"]
+
+    if cli is None:
+        return jsonify({"success": False, "error": "CLI not probed yet"}), 503
+    return (
+        jsonify(
             {
-                "success": result.returncode == 0,
-                "returncode": result.returncode,
-                "stdout": result.stdout,
-                "stderr": result.stderr,
+                "success": cli["ok"],
+                "checked_at": checked_at,
+                "elapsed_ms": cli["elapsed_ms"],
+                "output": cli["output"],
             }
-        )
-    except subprocess.TimeoutExpired as e:
-        return (
-            jsonify(
-                {
-                    "success": False,
-                    "error": f"Command timed out after {e.timeout} seconds",
-                }
-            ),
-            500,
-        )
-    except Exception as e:
-        return (
-            jsonify(
-                {"success": False, "error": str(e), "traceback": traceback.format_exc()}
-            ),
-            500,
-        )
+        ),
+        200 if cli["ok"] else 500,
+    )
 
 
 def parse_entrypoint_output(stdout):
+    """
+    Parse the output from entrypoint.sh and record the parse time and the
+    CLI's cost, duration and token usage for the current job
+    """
+    set_job(phase="parse")
+    start = time.monotonic()
+    parsed_output = parse_stdout(stdout)
+    add_phase_time("parse", (time.monotonic() - start) * 1000)
+    add_cli_usage(parsed_output)
+    return parsed_output
+
+
+def parse_stdout(stdout):
     """
     Parse the output from entrypoint.sh:
     1. Try to parse as JSON directly
@@ -158,11 +418,18 @@ def parse_entrypoint_output(stdout):
                     user_stories = json.loads(json_array_str)
                     parsed_json["user_stories"] = user_stories
 
-                    print(f"Replacing JSON. Before: {response_text}")
                     parsed_json["resultText"] = re.sub(
                         r"```json.*```", "", response_text, flags=re.DOTALL
                     ).strip()
-                    print(f"Replaced JSON. After: {parsed_json['resultText']}")
+                    logger.debug(
+                        "Replaced JSON block in resultText",
+                        extra={
+                            "fields": {
+                                "before": response_text,
+                                "after": parsed_json["resultText"],
+                            }
+                        },
+                    )
                 except json.JSONDecodeError:
                     pass
             else:
@@ -218,7 +485,7 @@ def inject_anthropic_api_key(api_key):
     if not api_key:
         return
 
-    config_dir = pathlib.Path("/home/node/.claude")
+    config_dir = pathlib.Path(CLAUDE_CONFIG_DIR)
     config_file = config_dir / "config.json"
 
     # Create directory if it doesn't exist
@@ -251,21 +518,31 @@ def run_entrypoint(args, api_key=None):
     Run the entrypoint.sh script with the given arguments
     """
     try:
+        # Attribute the job's usage to its API key and repository
+        repo_url = next(
+            (a.split("=", 1)[1] for a in args if a.startswith("--repo=")), ""
+        )
+        annotate_job(api_key=api_key, repo_url=repo_url)
+
         # Inject the Anthropic API key if provided
         if api_key:
             inject_anthropic_api_key(api_key)
 
         # Create necessary directories with proper permissions
-        os.makedirs("/home/node/.claude/statsig", exist_ok=True)
-        os.makedirs("/home/node/.ssh", exist_ok=True)
+        os.makedirs(os.path.join(CLAUDE_CONFIG_DIR, "statsig"), exist_ok=True)
+        os.makedirs(SSH_DIR, exist_ok=True)
 
         # Base command to run entrypoint.sh
-        cmd = ["/entrypoint.sh"]
+        cmd = [ENTRYPOINT_PATH]
 
         # Add all arguments
         cmd.extend(args)
 
-        # Run the command
+        # Run the command. Credentials in the arguments are redacted by the
+        # log formatter, off the request thread.
+        set_job(phase="entrypoint")
+        logger.info("Running entrypoint", extra={"fields": {"argv": cmd}})
+        start = time.monotonic()
         process = subprocess.Popen(
             cmd,
             stdout=subprocess.PIPE,
@@ -285,6 +562,22 @@ def run_entrypoint(args, api_key=None):
         if process.pid in running_processes:
             del running_processes[process.pid]
 
+        duration_ms = (time.monotonic() - start) * 1000
+        add_phase_time("entrypoint", duration_ms)
+
+        fields = {
+            "returncode": process.returncode,
+            "duration_ms": round(duration_ms, 1),
+            "stdout_bytes": len(stdout),
+            "stderr_bytes": len(stderr),
+        }
+        if process.returncode == 0:
+            logger.info("Entrypoint finished", extra={"fields": fields})
+        else:
+            # The end of stderr is where the error is
+            fields["stderr_tail"] = tail(stderr)
+            logger.warning("Entrypoint failed", extra={"fields": fields})
+
         # Create a result object similar to subprocess.run
         class Result:
             def __init__(self, returncode, stdout, stderr):
@@ -296,6 +589,8 @@ def run_entrypoint(args, api_key=None):
         return result
 
     except Exception as e:
+        logger.exception("Failed to run entrypoint")
+
         # Create a fake result object to return
         class ErrorResult:
             def __init__(self, error):
@@ -734,12 +1029,19 @@ class EpicResource(Resource):
                     # If JSON extraction fails, continue with empty user_stories
                     pass
 
-                print(f"Replacing JSON. Before: {response_text}")
                 # Add the extracted user stories to the parsed_output
                 parsed_output["resultText"] = re.sub(
                     r"```json.*```", "", response_text, flags=re.DOTALL
                 )
-                print(f"Replaced JSON. After: {parsed_output['resultText']}")
+                logger.debug(
+                    "Replaced JSON block in epic resultText",
+                    extra={
+                        "fields": {
+                            "before": response_text,
+                            "after": parsed_output["resultText"],
+                        }
+                    },
+                )
                 parsed_output["user_stories"] = user_stories
                 return parsed_output
 
@@ -749,21 +1051,94 @@ class EpicResource(Resource):
             return {"error": str(e)}, 500
 
 
+def usage_caller(f):
+    """
+    Authenticate a usage query. The admin token sees every API key; any
+    other caller is scoped to the fingerprint of the Anthropic API key it
+    sends in X-Anthropic-Api-Key.
+    """
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        auth = request.headers.get("Authorization", "")
+        if USAGE_ADMIN_TOKEN and hmac.compare_digest(
+            auth.encode(), f"Bearer {USAGE_ADMIN_TOKEN}".encode()
+        ):
+            return f(*args, fingerprint=None, **kwargs)
+        api_key = request.headers.get("X-Anthropic-Api-Key", "")
+        if not api_key:
+            return {
+                "error": "Send your Anthropic API key in X-Anthropic-Api-Key "
+                "or the admin token as a bearer token"
+            }, 401
+        return f(*args, fingerprint=api_key_fingerprint(api_key), **kwargs)
+
+    return wrapper
+
+
+class UsageResource(Resource):
+    method_decorators = [usage_caller]
+
+    def get(self, fingerprint):
+        # Rolling-window totals from the usage ledger of this instance only;
+        # the "Job usage" log records cover every instance
+        try:
+            window = int(request.args.get("window", 3600))
+        except ValueError:
+            return {"error": "'window' must be a number of seconds"}, 400
+
+        group_by = [
+            k
+            for k in request.args.get("group_by", ",".join(GROUP_KEYS)).split(",")
+            if k
+        ]
+        unknown = [k for k in group_by if k not in GROUP_KEYS]
+        if unknown:
+            return {"error": f"Cannot group by {', '.join(unknown)}"}, 400
+
+        filters = {k: request.args[k] for k in GROUP_KEYS if request.args.get(k)}
+        if fingerprint is not None:
+            # Callers without the admin token only see their own API key
+            filters["api_key_fingerprint"] = fingerprint
+        return {
+            "window_seconds": window,
+            "group_by": group_by,
+            "filters": filters,
+            "groups": ledger.query(window, group_by=group_by, filters=filters),
+        }
+
+
+class UsageJobResource(Resource):
+    method_decorators = [usage_caller]
+
+    def get(self, job_id, fingerprint):
+        record = ledger.get_job(job_id)
+        # Jobs of other API keys are reported as missing, not forbidden
+        if record is None or fingerprint not in (
+            None,
+            record["api_key_fingerprint"],
+        ):
+            return {"error": f"No usage recorded for job '{job_id}'"}, 404
+        return record
+
+
 # Register the resources
 api.add_resource(PlanResource, "/api/plan")
 api.add_resource(ActResource, "/api/act")
 api.add_resource(FeedbackResource, "/api/feedback")
 api.add_resource(EpicResource, "/api/epic")
+api.add_resource(UsageResource, "/api/usage")
+api.add_resource(UsageJobResource, "/api/usage/jobs/<string:job_id>")
 
 if __name__ == "__main__":
     # Get port from environment variable (Cloud Run sets PORT)
     port = int(os.environ.get("PORT", 8080))
 
     # Print a warning about using the development server
-    print(
-        "WARNING: This is a development server. Do not use it in a production deployment."
+    logger.warning(
+        "This is a development server. Do not use it in a production deployment. "
+        "Use a production WSGI server like Gunicorn instead."
     )
-    print("Use a production WSGI server like Gunicorn instead.")
 
     # Run the Flask development server
     # Note: The use_reloader=False parameter helps with signal handling
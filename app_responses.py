@@ -0,0 +1,182 @@
+"""
+Compact, compressed API responses.
+
+- Responses are serialized with orjson when it is installed.
+- `?fields=resultText,user_stories` limits a successful response to the
+  listed top-level fields.
+- Diagnostic fields of error responses (stderr, tracebacks) are truncated
+  to their end. What was cut is logged, in chunks, under the job id, and the
+  response carries the Cloud Logging query that finds it.
+- Bodies are compressed with brotli or gzip according to Accept-Encoding.
+
+Configured from the environment:
+
+    RESPONSE_DIAGNOSTIC_MAX_CHARS  characters kept per diagnostic field (default: 4000)
+    RESPONSE_COMPRESS_MIN_BYTES    smallest body worth compressing (default: 1024)
+    DIAGNOSTIC_LOG_MAX_CHARS       characters of each truncated field logged (default: 32000)
+"""
+
+import gzip
+import json
+import logging
+import os
+
+from flask import make_response, request
+
+from app_logging import LOG_FIELD_MAX_CHARS, get_record_logger, job_id_var
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RESPONSE_DIAGNOSTIC_MAX_CHARS = int(
+    os.environ.get("RESPONSE_DIAGNOSTIC_MAX_CHARS", "4000")
+)
+RESPONSE_COMPRESS_MIN_BYTES = int(os.environ.get("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+DIAGNOSTIC_LOG_MAX_CHARS = int(os.environ.get("DIAGNOSTIC_LOG_MAX_CHARS", "32000"))
+
+# Fields of error responses that carry diagnostics rather than results
+DIAGNOSTIC_FIELDS = ("details", "traceback", "stderr", "stdout")
+
+# The logs_query of error responses points at these records, so LOG_LEVEL
+# must not filter them out
+diagnostics_logger = get_record_logger("responses.diagnostics")
+
+
+def dumps(data):
+    """
+    Serialize data to compact JSON bytes
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # e.g. integers too large for orjson; fall back to the stdlib
+            pass
+    return json.dumps(data, separators=(",", ":"), default=str).encode()
+
+
+def select_fields(data, fields):
+    """
+    Keep only the requested top-level fields of a response
+    """
+    wanted = {field.strip() for field in fields.split(",") if field.strip()}
+    if not wanted:
+        return data
+    return {key: value for key, value in data.items() if key in wanted}
+
+
+def log_diagnostics(full):
+    """
+    Log the end of each truncated diagnostic field under the current job id,
+    split into chunks that fit the log field limit
+    """
+    for field, value in full.items():
+        value = value[-DIAGNOSTIC_LOG_MAX_CHARS:]
+        chunks = [
+            value[i : i + LOG_FIELD_MAX_CHARS]
+            for i in range(0, len(value), LOG_FIELD_MAX_CHARS)
+        ]
+        for index, chunk in enumerate(chunks):
+            diagnostics_logger.warning(
+                "Response diagnostics",
+                extra={
+                    "fields": {
+                        "field": field,
+                        "chunk": index,
+                        "chunks": len(chunks),
+                        "text": chunk,
+                    }
+                },
+            )
+
+
+def truncate_diagnostics(data):
+    """
+    Truncate long diagnostic fields of an error response, keeping their
+    end, and point to the log records holding the rest
+    """
+    job_id = job_id_var.get()
+    limit = RESPONSE_DIAGNOSTIC_MAX_CHARS
+    full = {}
+    for field in DIAGNOSTIC_FIELDS:
+        value = data.get(field)
+        if isinstance(value, str) and len(value) > limit:
+            full[field] = value
+    if not full:
+        return data
+
+    data = dict(data)
+    for field, value in full.items():
+        # The end of stderr and tracebacks is usually the interesting part
+        data[field] = f"[truncated {len(value) - limit} chars]...{value[-limit:]}"
+    data["truncated_fields"] = sorted(full)
+    if not diagnostics_logger.isEnabledFor(logging.WARNING):
+        # Do not point to records that are never written
+        return data
+    log_diagnostics(full)
+    if job_id:
+        data["job_id"] = job_id
+        data["logs_query"] = f'jsonPayload.job_id="{job_id}"'
+    return data
+
+
+def output_json(data, code, headers=None):
+    """
+    flask-restful representation for application/json using the compact
+    encoder, field selection and diagnostic truncation
+    """
+    if isinstance(data, dict):
+        if code >= 400:
+            data = truncate_diagnostics(data)
+        elif request.args.get("fields"):
+            data = select_fields(data, request.args["fields"])
+
+    resp = make_response(dumps(data), code)
+    resp.headers.extend(headers or {})
+    resp.headers["Content-Type"] = "application/json"
+    return resp
+
+
+def choose_encoding():
+    """
+    Pick the best supported content encoding the client accepts
+    """
+    supported = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(supported)
+
+
+def compress_response(response):
+    """
+    Compress the response body according to Accept-Encoding
+    """
+    response.vary.add("Accept-Encoding")
+    if (
+        response.direct_passthrough
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    body = response.get_data()
+    if len(body) < RESPONSE_COMPRESS_MIN_BYTES:
+        return response
+
+    encoding = choose_encoding()
+    if encoding == "br":
+        compressed = brotli.compress(body, quality=5)
+    elif encoding == "gzip":
+        compressed = gzip.compress(body, compresslevel=6)
+    else:
+        return response
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,325 @@
+"""
+Per-job cost, token and latency ledger.
+
+The patched CLI prints its full result object, including cost, duration,
+turn count and token usage. Those fields are recorded for every job together
+with the wall-clock time of each phase, and aggregated per API-key
+fingerprint, repository and endpoint into time buckets so rolling-window
+totals are cheap to query.
+
+Every finished job is written as a structured "Job usage" log record, on a
+logger whose level LOG_LEVEL does not change. Those records are the durable
+ledger: aggregate them across instances in Cloud Logging or a log sink. The in-memory ledger behind /api/usage is
+per-instance and only covers what this instance handled since it started.
+
+Configured from the environment:
+
+    USAGE_BUCKET_SECONDS     width of an aggregation bucket (default: 60)
+    USAGE_RETENTION_SECONDS  how long buckets are kept (default: 86400)
+    USAGE_MAX_JOBS           jobs whose individual records are kept (default: 1000)
+"""
+
+import contextvars
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from app_logging import get_record_logger
+
+USAGE_BUCKET_SECONDS = int(os.environ.get("USAGE_BUCKET_SECONDS", "60"))
+USAGE_RETENTION_SECONDS = int(os.environ.get("USAGE_RETENTION_SECONDS", "86400"))
+USAGE_MAX_JOBS = int(os.environ.get("USAGE_MAX_JOBS", "1000"))
+
+# Fields of the CLI result object copied into the ledger, with the names
+# older or newer CLI versions use for them
+CLI_FIELDS = {
+    "cost_usd": ("cost_usd", "total_cost_usd", "total_cost"),
+    "duration_ms": ("duration_ms",),
+    "duration_api_ms": ("duration_api_ms",),
+    "num_turns": ("num_turns",),
+}
+TOKEN_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_creation_input_tokens",
+    "cache_read_input_tokens",
+)
+
+# Values summed per bucket. Each one is counted separately, because failed
+# jobs do not report the CLI fields and must not drag their means down.
+SUM_FIELDS = (
+    "cost_usd",
+    "duration_ms",
+    "duration_api_ms",
+    "num_turns",
+    *TOKEN_FIELDS,
+    "total_ms",
+    "entrypoint_ms",
+    "parse_ms",
+)
+
+GROUP_KEYS = ("api_key_fingerprint", "repo", "endpoint")
+
+# Fields reported as means over the jobs that reported them
+MEAN_FIELDS = (
+    "total_ms",
+    "entrypoint_ms",
+    "parse_ms",
+    "duration_ms",
+    "duration_api_ms",
+)
+
+# The "Job usage" records are the durable ledger, so LOG_LEVEL must not
+# filter them out
+logger = get_record_logger("usage")
+
+# The job being handled by the current request
+current_job = contextvars.ContextVar("usage_job", default=None)
+
+
+def api_key_fingerprint(api_key):
+    """
+    Short, non-reversible identifier of an API key
+    """
+    if not api_key:
+        return "none"
+    return hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+
+def normalize_repo(repo_url):
+    """
+    Repository URL without credentials or a trailing .git, for grouping
+    """
+    if not repo_url:
+        return "none"
+    if "://" in repo_url:
+        parts = urlsplit(repo_url)
+        host = parts.hostname or ""
+        if parts.port:
+            host = f"{host}:{parts.port}"
+        repo = f"{parts.scheme}://{host}{parts.path}"
+    else:
+        # scp-like syntax, e.g. git@github.com:org/repo.git
+        repo = repo_url.split("@", 1)[-1]
+    return repo[:-4] if repo.endswith(".git") else repo
+
+
+def extract_cli_usage(parsed_output):
+    """
+    Pick the cost, duration and token fields out of the CLI result object
+    """
+    usage = {}
+    for field, names in CLI_FIELDS.items():
+        for name in names:
+            value = parsed_output.get(name)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                usage[field] = value
+                break
+    tokens = parsed_output.get("usage")
+    if isinstance(tokens, dict):
+        for field in TOKEN_FIELDS:
+            value = tokens.get(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                usage[field] = value
+    return usage
+
+
+def begin_job(job_id, endpoint):
+    """
+    Start tracking the job of the current request
+    """
+    current_job.set(
+        {
+            "job_id": job_id,
+            "endpoint": endpoint,
+            "api_key_fingerprint": "none",
+            "repo": "none",
+            "started": time.monotonic(),
+            "phases_ms": {},
+            "cli": {},
+        }
+    )
+
+
+def annotate_job(api_key=None, repo_url=None):
+    """
+    Attach the API-key fingerprint and repository to the current job
+    """
+    job = current_job.get()
+    if job is None:
+        return
+    if api_key is not None:
+        job["api_key_fingerprint"] = api_key_fingerprint(api_key)
+    if repo_url is not None:
+        job["repo"] = normalize_repo(repo_url)
+
+
+def add_phase_time(phase, elapsed_ms):
+    """
+    Add wall-clock time spent in a phase of the current job
+    """
+    job = current_job.get()
+    if job is None:
+        return
+    phases = job["phases_ms"]
+    phases[phase] = round(phases.get(phase, 0) + elapsed_ms, 1)
+
+
+def add_cli_usage(parsed_output):
+    """
+    Record the usage fields of the CLI result object for the current job
+    """
+    job = current_job.get()
+    if job is None or not isinstance(parsed_output, dict):
+        return
+    job["cli"].update(extract_cli_usage(parsed_output))
+
+
+def finish_job(status_code):
+    """
+    Close the current job and add it to the ledger
+    """
+    job = current_job.get()
+    if job is None:
+        return
+    current_job.set(None)
+
+    # Requests rejected before the entrypoint ran did not start a job
+    if "entrypoint" not in job["phases_ms"]:
+        return
+
+    record = {
+        "job_id": job["job_id"],
+        "endpoint": job["endpoint"],
+        "api_key_fingerprint": job["api_key_fingerprint"],
+        "repo": job["repo"],
+        "status_code": status_code,
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "total_ms": round((time.monotonic() - job["started"]) * 1000, 1),
+        "phases_ms": job["phases_ms"],
+        **job["cli"],
+    }
+    # The log record is what persists across instances and restarts
+    logger.info("Job usage", extra={"fields": record})
+    ledger.record(record)
+
+
+class UsageLedger:
+    """
+    Job records plus per-(api key, repo, endpoint) time-bucketed totals
+    """
+
+    def __init__(self, bucket_seconds, retention_seconds, max_jobs):
+        self.bucket_seconds = bucket_seconds
+        self.retention_seconds = retention_seconds
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        # (api_key_fingerprint, repo, endpoint) -> deque of [bucket start, totals]
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def record(self, record, now=None):
+        now = time.time() if now is None else now
+        bucket_start = int(now // self.bucket_seconds) * self.bucket_seconds
+        values = dict(record)
+        for phase in ("entrypoint", "parse"):
+            if phase in record["phases_ms"]:
+                values[f"{phase}_ms"] = record["phases_ms"][phase]
+
+        with self.lock:
+            self.jobs[record["job_id"]] = record
+            while len(self.jobs) > self.max_jobs:
+                self.jobs.popitem(last=False)
+
+            key = tuple(record[k] for k in GROUP_KEYS)
+            series = self.buckets.setdefault(key, deque())
+            if not series or series[-1][0] != bucket_start:
+                series.append(
+                    [bucket_start, {"jobs": 0, "failures": 0, "max_total_ms": 0}]
+                )
+            totals = series[-1][1]
+            totals["jobs"] += 1
+            if record["status_code"] >= 400:
+                totals["failures"] += 1
+            totals["max_total_ms"] = max(totals["max_total_ms"], record["total_ms"])
+            for field in SUM_FIELDS:
+                if field in values:
+                    totals[field] = totals.get(field, 0) + values[field]
+                    totals[f"{field}_count"] = totals.get(f"{field}_count", 0) + 1
+
+            self._evict(now)
+
+    def _evict(self, now):
+        cutoff = now - self.retention_seconds
+        for key in list(self.buckets):
+            series = self.buckets[key]
+            while series and series[0][0] + self.bucket_seconds <= cutoff:
+                series.popleft()
+            if not series:
+                del self.buckets[key]
+
+    def get_job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def query(self, window_seconds, group_by=GROUP_KEYS, filters=None, now=None):
+        """
+        Totals over the last window_seconds, grouped by the given keys. Only
+        covers jobs recorded by this instance.
+        """
+        now = time.time() if now is None else now
+        cutoff = now - window_seconds
+        filters = filters or {}
+        groups = {}
+
+        with self.lock:
+            for key, series in self.buckets.items():
+                labels = dict(zip(GROUP_KEYS, key))
+                if any(labels[k] != v for k, v in filters.items()):
+                    continue
+                group_key = tuple(labels[k] for k in group_by)
+                group = groups.setdefault(
+                    group_key, {"jobs": 0, "failures": 0, "max_total_ms": 0}
+                )
+                # Buckets are in time order, so walk back from the newest
+                for bucket_start, totals in reversed(series):
+                    if bucket_start + self.bucket_seconds <= cutoff:
+                        break
+                    for field, value in totals.items():
+                        if field == "max_total_ms":
+                            group[field] = max(group[field], value)
+                        else:
+                            group[field] = group.get(field, 0) + value
+
+        results = []
+        for group_key, totals in groups.items():
+            jobs = totals["jobs"]
+            entry = dict(zip(group_by, group_key))
+            entry.update(
+                {
+                    "jobs": jobs,
+                    "failures": totals["failures"],
+                    "jobs_with_cli_usage": totals.get("cost_usd_count", 0),
+                    "cost_usd": round(totals.get("cost_usd", 0), 6),
+                    "num_turns": totals.get("num_turns", 0),
+                    "max_total_ms": totals["max_total_ms"],
+                }
+            )
+            for field in TOKEN_FIELDS:
+                entry[field] = totals.get(field, 0)
+            for field in MEAN_FIELDS:
+                count = totals.get(f"{field}_count", 0)
+                entry[f"mean_{field}"] = (
+                    round(totals[field] / count, 1) if count else None
+                )
+            results.append(entry)
+
+        results.sort(key=lambda entry: entry["cost_usd"], reverse=True)
+        return results
+
+
+ledger = UsageLedger(USAGE_BUCKET_SECONDS, USAGE_RETENTION_SECONDS, USAGE_MAX_JOBS)
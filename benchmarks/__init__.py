@@ -0,0 +1,10 @@
+"""
+Offline benchmark suite for the Never Sleeps Persona API.
+
+Everything in this package runs without network access or model calls:
+the entrypoint script and the Claude CLI are replaced by a stub that emits
+canned output, and repositories are cloned from a local bare git repo.
+
+    python -m benchmarks.load --concurrency 1,4,16 --requests 100
+    python -m benchmarks.parse_bench
+"""
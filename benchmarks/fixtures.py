@@ -0,0 +1,60 @@
+"""
+Local fixtures for the benchmark suite
+"""
+
+import os
+import subprocess
+
+# Environment for git commands that must not depend on the user's git config
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "AI",
+    "GIT_AUTHOR_EMAIL": "ai@example.com",
+    "GIT_COMMITTER_NAME": "AI",
+    "GIT_COMMITTER_EMAIL": "ai@example.com",
+    "GIT_CONFIG_NOSYSTEM": "1",
+}
+
+
+def git(*args, cwd=None):
+    """
+    Run a git command, raising if it fails
+    """
+    subprocess.run(
+        ["git", *args],
+        cwd=cwd,
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env={**os.environ, **GIT_ENV},
+    )
+
+
+def make_bare_repo(root, branch="main", files=20):
+    """
+    Create a bare git repository under root with a single commit on branch.
+    Returns a file:// URL that can be passed as repo_url.
+    """
+    bare_dir = os.path.join(root, "fixture.git")
+    work_dir = os.path.join(root, "fixture-work")
+    os.makedirs(work_dir, exist_ok=True)
+
+    git("init", "--quiet", "--bare", bare_dir)
+    git("symbolic-ref", "HEAD", f"refs/heads/{branch}", cwd=bare_dir)
+    git("init", "--quiet", work_dir)
+    git("checkout", "--quiet", "-b", branch, cwd=work_dir)
+
+    # Populate the repository with a small Next.js-like layout
+    with open(os.path.join(work_dir, "README.md"), "w") as f:
+        f.write("# Fixture repository\n")
+    pages_dir = os.path.join(work_dir, "app")
+    os.makedirs(pages_dir, exist_ok=True)
+    for i in range(files):
+        with open(os.path.join(pages_dir, f"page{i}.tsx"), "w") as f:
+            f.write(f"export default function Page{i}() {{ return null; }}\n")
+
+    git("add", ".", cwd=work_dir)
+    git("commit", "--quiet", "-m", "Initial commit", cwd=work_dir)
+    git("remote", "add", "origin", bare_dir, cwd=work_dir)
+    git("push", "--quiet", "origin", branch, cwd=work_dir)
+
+    return f"file://{bare_dir}"
@@ -0,0 +1,391 @@
+"""
+Load generator for the API endpoints, driven by the stub CLI.
+
+Starts the Flask app in-process on a random local port with the entrypoint
+and CLI replaced by stub_entrypoint.py, then drives /api/plan, /api/act,
+/api/feedback and /api/epic at each requested concurrency level and reports
+p50/p95/p99 latency, requests/sec, peak RSS and subprocess counts.
+
+    python -m benchmarks.load --concurrency 1,4,16 --requests 100 --delay-ms 50
+
+Use --max-p95-ms, --min-rps and --max-error-rate to turn the run into a
+gate: the process exits with status 1 if any level misses a threshold. When
+the stub is not asked to fail (--failure-rate 0), any non-2xx response fails
+the run unless --max-error-rate says otherwise.
+
+RSS is sampled from /proc (Linux only) per level. Because the app runs
+in-process, harness_peak_rss_mb covers the app and the load generator
+together; peak_subprocess_rss_mb is the peak combined RSS of the entrypoint
+subprocesses running at the same time.
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fixtures import make_bare_repo
+
+STUB_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "stub_entrypoint.py"
+)
+
+ENDPOINTS = ["plan", "act", "feedback", "epic"]
+
+
+def build_payload(endpoint, repo_url, n):
+    """
+    Build a valid request body for the given endpoint
+    """
+    payload = {"repo_url": repo_url} if repo_url else {}
+    issue_key = f"BENCH-{n}"
+    if endpoint == "plan":
+        payload.update(
+            {
+                "summary": "Add checklist sharing",
+                "description": "Users share checklists.",
+            }
+        )
+    elif endpoint == "act":
+        payload.update(
+            {"plan": "Add a share button to the toolbar.", "issue_key": issue_key}
+        )
+    elif endpoint == "feedback":
+        payload.update(
+            {
+                "issue_key": issue_key,
+                "comments": [
+                    {"path": "app/page.tsx", "line": 3, "body": "Rename this."}
+                ],
+            }
+        )
+    elif endpoint == "epic":
+        payload.update(
+            {
+                "summary": "Checklist collaboration",
+                "description": "Let users collaborate on checklists.",
+                "issue_key": issue_key,
+            }
+        )
+    return payload
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_mb(pid="self"):
+    """
+    Current resident set size of a process in MB, or None if unavailable
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class SubprocessSampler(threading.Thread):
+    """
+    Samples the app's running_processes table during one level to find the
+    peak number of concurrent entrypoint subprocesses, their peak combined
+    RSS and the peak RSS of the harness process
+    """
+
+    def __init__(self, running_processes, interval=0.005):
+        super().__init__(daemon=True)
+        self.running_processes = running_processes
+        self.interval = interval
+        self.peak = 0
+        self.peak_subprocess_rss = None
+        self.peak_harness_rss = None
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            pids = list(self.running_processes)
+            self.peak = max(self.peak, len(pids))
+
+            harness = rss_mb()
+            if harness is not None:
+                self.peak_harness_rss = max(self.peak_harness_rss or 0, harness)
+            children = [rss_mb(pid) for pid in pids]
+            children = [rss for rss in children if rss is not None]
+            if children:
+                self.peak_subprocess_rss = max(
+                    self.peak_subprocess_rss or 0, sum(children)
+                )
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def send(base_url, endpoint, payload, accept_encoding="", fields=""):
+    """
+    POST a payload and return (status code, latency in seconds, response size)
+    """
+    body = json.dumps(payload).encode()
+    headers = {"Content-Type": "application/json"}
+    if accept_encoding:
+        headers["Accept-Encoding"] = accept_encoding
+    query = f"?fields={fields}" if fields else ""
+    req = urllib.request.Request(
+        f"{base_url}/api/{endpoint}{query}",
+        data=body,
+        headers=headers,
+        method="POST",
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=600) as resp:
+            data = resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        data = e.read()
+        status = e.code
+    return status, time.perf_counter() - start, len(data)
+
+
+def run_level(
+    base_url,
+    app_module,
+    endpoints,
+    concurrency,
+    total,
+    repo_url,
+    spawn_log,
+    accept_encoding="",
+    fields="",
+):
+    """
+    Run one concurrency level and return its report
+    """
+    spawned_before = count_lines(spawn_log)
+    sampler = SubprocessSampler(app_module.running_processes)
+    sampler.start()
+
+    def run_job(n):
+        endpoint = endpoints[n % len(endpoints)]
+        payload = build_payload(endpoint, repo_url, n)
+        return (endpoint, *send(base_url, endpoint, payload, accept_encoding, fields))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(run_job, range(total)))
+    elapsed = time.perf_counter() - start
+    sampler.stop()
+
+    latencies = [r[2] * 1000 for r in results]
+    statuses = {}
+    for _, status, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    per_endpoint = {}
+    for endpoint in endpoints:
+        endpoint_latencies = [r[2] * 1000 for r in results if r[0] == endpoint]
+        per_endpoint[endpoint] = {
+            "p50_ms": round(percentile(endpoint_latencies, 50), 2),
+            "p95_ms": round(percentile(endpoint_latencies, 95), 2),
+        }
+
+    def mb(value):
+        return round(value, 1) if value is not None else None
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_sec": round(total / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2) if latencies else 0.0,
+        "statuses": statuses,
+        "error_rate": (
+            round(sum(1 for r in results if not 200 <= r[1] < 300) / len(results), 4)
+            if results
+            else 0.0
+        ),
+        "mean_response_bytes": (
+            int(sum(r[3] for r in results) / len(results)) if results else 0
+        ),
+        "subprocesses_spawned": count_lines(spawn_log) - spawned_before,
+        "peak_concurrent_subprocesses": sampler.peak,
+        "harness_peak_rss_mb": mb(sampler.peak_harness_rss),
+        "peak_subprocess_rss_mb": mb(sampler.peak_subprocess_rss),
+        "endpoints": per_endpoint,
+    }
+
+
+def count_lines(path):
+    """
+    Count the lines of a file, treating a missing file as empty
+    """
+    try:
+        with open(path) as f:
+            return sum(1 for _ in f)
+    except FileNotFoundError:
+        return 0
+
+
+def start_server(app_module):
+    """
+    Serve the Flask app on a random local port in a background thread
+    """
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        # Per-request access logs would only measure the terminal
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server(
+        "127.0.0.1",
+        0,
+        app_module.app,
+        threaded=True,
+        request_handler=QuietRequestHandler,
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--concurrency", default="1,4,16", help="comma-separated levels"
+    )
+    parser.add_argument("--requests", type=int, default=40, help="requests per level")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--output", default="stories", help="stub output kind")
+    parser.add_argument("--delay-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--transcript-kb", type=int, default=512)
+    parser.add_argument("--no-repo", action="store_true", help="skip the git clone")
+    parser.add_argument("--accept-encoding", default="", help="e.g. 'br, gzip'")
+    parser.add_argument("--fields", default="", help="e.g. 'resultText,user_stories'")
+    parser.add_argument(
+        "--max-p95-ms", type=float, help="fail if any level exceeds this"
+    )
+    parser.add_argument("--min-rps", type=float, help="fail if any level is below this")
+    parser.add_argument(
+        "--max-error-rate",
+        type=float,
+        help="fail if the share of non-2xx responses exceeds this "
+        "(default: 0 when --failure-rate is 0, otherwise unchecked)",
+    )
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    endpoints = [e for e in args.endpoints.split(",") if e]
+    levels = [int(c) for c in args.concurrency.split(",") if c]
+    max_error_rate = args.max_error_rate
+    if max_error_rate is None and args.failure_rate == 0:
+        max_error_rate = 0.0
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    spawn_log = os.path.join(workdir, "spawns.log")
+    repo_url = "" if args.no_repo else make_bare_repo(workdir)
+
+    # Point the app at the stub before importing it, and keep it away from
+    # the real Claude config and SSH directories
+    os.environ.update(
+        {
+            "ENTRYPOINT_PATH": STUB_PATH,
+            "CLAUDE_CLI_PATH": STUB_PATH,
+            "CLAUDE_CONFIG_DIR": os.path.join(workdir, "claude"),
+            "SSH_DIR": os.path.join(workdir, "ssh"),
+            "NODE_COMPILE_CACHE": os.path.join(workdir, "node-compile-cache"),
+            "ANTHROPIC_API_KEY": "",
+            "STUB_OUTPUT": args.output,
+            "STUB_DELAY_MS": str(args.delay_ms),
+            "STUB_JITTER_MS": str(args.jitter_ms),
+            "STUB_FAILURE_RATE": str(args.failure_rate),
+            "STUB_TRANSCRIPT_KB": str(args.transcript_kb),
+            "STUB_SPAWN_LOG": spawn_log,
+        }
+    )
+    # Keep the app's own logs out of the report unless asked for
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    import app as app_module
+
+    server, base_url = start_server(app_module)
+    reports = []
+    failures = []
+    try:
+        for level in levels:
+            report = run_level(
+                base_url,
+                app_module,
+                endpoints,
+                level,
+                args.requests,
+                repo_url,
+                spawn_log,
+                accept_encoding=args.accept_encoding,
+                fields=args.fields,
+            )
+            reports.append(report)
+            if args.max_p95_ms is not None and report["p95_ms"] > args.max_p95_ms:
+                failures.append(
+                    f"concurrency {level}: p95 {report['p95_ms']}ms > {args.max_p95_ms}ms"
+                )
+            if args.min_rps is not None and report["requests_per_sec"] < args.min_rps:
+                failures.append(
+                    f"concurrency {level}: {report['requests_per_sec']} req/s < {args.min_rps} req/s"
+                )
+            if max_error_rate is not None and report["error_rate"] > max_error_rate:
+                failures.append(
+                    f"concurrency {level}: error rate {report['error_rate']} > {max_error_rate} "
+                    f"(statuses {report['statuses']})"
+                )
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({"levels": reports, "failures": failures}, indent=2))
+    else:
+        for r in reports:
+            print(
+                f"c={r['concurrency']:<4} n={r['requests']:<5} "
+                f"rps={r['requests_per_sec']:<8} p50={r['p50_ms']}ms p95={r['p95_ms']}ms "
+                f"p99={r['p99_ms']}ms spawned={r['subprocesses_spawned']} "
+                f"peak_procs={r['peak_concurrent_subprocesses']} "
+                f"harness_rss={r['harness_peak_rss_mb']}MB "
+                f"subprocess_rss={r['peak_subprocess_rss_mb']}MB "
+                f"statuses={r['statuses']}"
+            )
+        for failure in failures:
+            print(f"FAILED: {failure}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
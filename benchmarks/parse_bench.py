@@ -0,0 +1,64 @@
+"""
+Microbenchmarks of parse_entrypoint_output on canned CLI output.
+
+    python -m benchmarks.parse_bench --number 200
+"""
+
+import argparse
+import json
+import sys
+import timeit
+
+from benchmarks.stub_entrypoint import build_cli_output
+
+
+def build_cases(transcript_kb):
+    """
+    Canned stdout samples covering the different parsing paths
+    """
+    return {
+        "text": build_cli_output("text"),
+        "stories": build_cli_output("stories"),
+        "fenced-stories": build_cli_output("fenced-stories"),
+        "large": build_cli_output("large", transcript_kb),
+        "not-json": "Failed to clone repository\n{oops: this is not json}\n",
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--number", type=int, default=200, help="calls per repeat")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--transcript-kb", type=int, default=512)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    from app import parse_entrypoint_output
+
+    report = {}
+    for name, stdout in build_cases(args.transcript_kb).items():
+        timings = timeit.repeat(
+            lambda: parse_entrypoint_output(stdout),
+            number=args.number,
+            repeat=args.repeat,
+        )
+        best = min(timings) / args.number
+        report[name] = {
+            "input_bytes": len(stdout),
+            "best_us": round(best * 1e6, 2),
+            "mb_per_sec": round(len(stdout) / best / 1e6, 2) if best else 0.0,
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, r in report.items():
+            print(
+                f"{name:<16} {r['input_bytes']:>10} bytes  {r['best_us']:>12} us/call  "
+                f"{r['mb_per_sec']:>8} MB/s"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Stand-in for entrypoint.sh and cli.js that never calls a model.
+
+It accepts the same arguments as entrypoint.sh, optionally clones the
+repository given with --repo (use a local bare repo, see fixtures.py), sleeps
+for a configurable time and prints a canned JSON object shaped like the
+output of the patched CLI. Behaviour is configured from the environment:
+
+    STUB_OUTPUT          text | stories | fenced-stories | large (default: stories)
+    STUB_DELAY_MS        base delay before answering (default: 0)
+    STUB_JITTER_MS       random extra delay added on top (default: 0)
+    STUB_FAILURE_RATE    probability of failing with exit code 1 (default: 0)
+    STUB_TRANSCRIPT_KB   size of the resultText for the "large" output (default: 512)
+    STUB_SPAWN_LOG       if set, one line is appended per invocation
+    STUB_SEED            seed for the random generator, mixed with the pid
+
+When called with --help or --version it behaves like the CLI probed by
+/ready.
+"""
+
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+USER_STORIES = [
+    {
+        "id": "US-1",
+        "title": "As a user I should be able to create a checklist",
+        "description": "Add a form in app/checklists/new/page.tsx that posts the new checklist.",
+        "depends_on": None,
+    },
+    {
+        "id": "US-2",
+        "title": "As a user I should be able to edit a checklist",
+        "description": "Reuse the slate editor in app/components/editor for editing.",
+        "depends_on": "US-1",
+    },
+    {
+        "id": "US-3",
+        "title": "As a user I should not be able to delete a checklist I do not own",
+        "description": "Check ownership before deleting in app/checklist/page.tsx.",
+        "depends_on": "US-1",
+    },
+]
+
+PLAN_TEXT = (
+    "Summary of the relevant existing code: the checklist pages live in app/checklist "
+    "and app/checklists/new, and the editor components live in app/components/editor.\n"
+    "Plan: add the new fields to the editor types, extend the toolbar and persist the "
+    "checklist on save.\n"
+    "Challenges: the editor state is not serialisable as-is and needs a conversion step."
+)
+
+
+def build_result_text(kind, transcript_kb=512):
+    """
+    Build the resultText for the requested kind of canned output
+    """
+    if kind == "text":
+        return PLAN_TEXT
+    if kind == "stories":
+        return f"{PLAN_TEXT}\n\n{json.dumps(USER_STORIES)}"
+    if kind == "fenced-stories":
+        return f"{PLAN_TEXT}\n\n```json\n{json.dumps(USER_STORIES, indent=2)}\n```"
+    if kind == "large":
+        line = "Explored the repository and read the relevant files in detail.\n"
+        repeat = max(1, (transcript_kb * 1024) // len(line))
+        return f"{line * repeat}\n```json\n{json.dumps(USER_STORIES, indent=2)}\n```"
+    raise ValueError(f"Unknown stub output kind: {kind}")
+
+
+def build_cli_output(kind, transcript_kb=512, duration_ms=0):
+    """
+    Build the full stdout of a successful run: some noise from entrypoint.sh
+    followed by the JSON object printed by the patched CLI
+    """
+    result = {
+        "role": "system",
+        "cost_usd": 0.0421,
+        "duration_ms": duration_ms,
+        "duration_api_ms": duration_ms,
+        "num_turns": 7,
+        "session_id": "00000000-0000-0000-0000-000000000000",
+        "usage": {
+            "input_tokens": 18250,
+            "output_tokens": 1342,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 12000,
+        },
+        "resultText": build_result_text(kind, transcript_kb),
+    }
+    return f"Already on 'main'\nAlready up to date.\n{json.dumps(result)}\n"
+
+
+def clone_repo(repo_url, branch):
+    """
+    Clone the repository into a throwaway directory, like entrypoint.sh does
+    """
+    workdir = tempfile.mkdtemp(prefix="stub-clone-")
+    try:
+        subprocess.run(
+            ["git", "clone", "--quiet", "--branch", branch, repo_url, workdir],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv):
+    if "--help" in argv:
+        print("Usage: claude [options] [command] [prompt]")
+        return 0
+    if "--version" in argv:
+        print("0.2.35 (Claude Code stub)")
+        return 0
+
+    spawn_log = os.environ.get("STUB_SPAWN_LOG")
+    if spawn_log:
+        with open(spawn_log, "a") as f:
+            f.write(f"{os.getpid()}\n")
+
+    # Parse the same arguments as entrypoint.sh
+    repo_url = ""
+    branch = "main"
+    for arg in argv:
+        if arg.startswith("--repo="):
+            repo_url = arg.split("=", 1)[1]
+        elif arg.startswith("--branch="):
+            branch = arg.split("=", 1)[1]
+
+    # Every invocation is a new process, so mix the pid into the seed;
+    # otherwise all runs with the same STUB_SEED would draw the same numbers
+    seed = os.environ.get("STUB_SEED")
+    rng = random.Random(f"{seed}:{os.getpid()}" if seed is not None else None)
+    kind = os.environ.get("STUB_OUTPUT", "stories")
+    delay_ms = float(os.environ.get("STUB_DELAY_MS", "0"))
+    jitter_ms = float(os.environ.get("STUB_JITTER_MS", "0"))
+    failure_rate = float(os.environ.get("STUB_FAILURE_RATE", "0"))
+    transcript_kb = int(os.environ.get("STUB_TRANSCRIPT_KB", "512"))
+
+    start = time.monotonic()
+    try:
+        if repo_url:
+            clone_repo(repo_url, branch)
+    except subprocess.CalledProcessError as e:
+        print("Failed to clone repository")
+        sys.stderr.write(e.stderr.decode(errors="replace"))
+        return 1
+
+    time.sleep((delay_ms + rng.uniform(0, jitter_ms)) / 1000)
+
+    if rng.random() < failure_rate:
+        sys.stderr.write("Error: simulated CLI failure\n")
+        print('{"error":"Command failed with exit code 1"}')
+        return 1
+
+    duration_ms = int((time.monotonic() - start) * 1000)
+    sys.stdout.write(build_cli_output(kind, transcript_kb, duration_ms))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,118 @@
+import gzip
+import logging
+
+import pytest
+from flask import Flask
+
+import app_responses
+from app_logging import job_id_var
+from app_responses import (
+    compress_response,
+    output_json,
+    select_fields,
+    truncate_diagnostics,
+)
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.after_request(compress_response)
+
+    @app.route("/result")
+    def result():
+        return output_json({"resultText": "x" * 4096, "user_stories": []}, 200)
+
+    @app.route("/small")
+    def small():
+        return output_json({"resultText": "short"}, 200)
+
+    @app.route("/error")
+    def error():
+        return output_json({"error": "failed", "stderr": "e" * 10000}, 500)
+
+    return app.test_client()
+
+
+def test_select_fields_keeps_requested_top_level_fields():
+    data = {"resultText": "plan", "user_stories": [], "role": "system"}
+    assert select_fields(data, "resultText, user_stories") == {
+        "resultText": "plan",
+        "user_stories": [],
+    }
+    assert select_fields(data, "missing") == {}
+    assert select_fields(data, " , ") == data
+
+
+def test_truncate_diagnostics_keeps_the_end_and_points_to_the_logs(caplog):
+    token = job_id_var.set("job123")
+    try:
+        with caplog.at_level(logging.INFO, logger="persona"):
+            data = truncate_diagnostics(
+                {"error": "failed", "stderr": "a" * 5000 + "the real error"}
+            )
+    finally:
+        job_id_var.reset(token)
+
+    limit = app_responses.RESPONSE_DIAGNOSTIC_MAX_CHARS
+    assert data["error"] == "failed"
+    assert data["stderr"].endswith("the real error")
+    assert data["stderr"].startswith(f"[truncated {5014 - limit} chars]...")
+    assert data["truncated_fields"] == ["stderr"]
+    assert data["job_id"] == "job123"
+    assert data["logs_query"] == 'jsonPayload.job_id="job123"'
+
+    chunks = [r for r in caplog.records if r.getMessage() == "Response diagnostics"]
+    assert "".join(r.fields["text"] for r in chunks).endswith("the real error")
+
+
+def test_truncate_diagnostics_leaves_short_fields_alone():
+    data = {"error": "failed", "stderr": "short"}
+    assert truncate_diagnostics(data) is data
+
+
+def test_truncate_diagnostics_omits_logs_query_when_records_are_filtered(monkeypatch):
+    monkeypatch.setattr(app_responses.diagnostics_logger, "level", logging.ERROR)
+    token = job_id_var.set("job123")
+    try:
+        data = truncate_diagnostics({"stderr": "a" * 5000})
+    finally:
+        job_id_var.reset(token)
+
+    assert data["truncated_fields"] == ["stderr"]
+    assert "logs_query" not in data
+
+
+def test_compresses_large_bodies_with_gzip(client):
+    response = client.get("/result", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert gzip.decompress(response.data).startswith(b'{"resultText":"xxx')
+
+
+def test_prefers_brotli_when_available(client):
+    if app_responses.brotli is None:
+        pytest.skip("brotli is not installed")
+    response = client.get("/result", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["Content-Encoding"] == "br"
+
+
+def test_does_not_compress_small_or_unaccepted_responses(client):
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+    response = client.get("/result", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.get_json()["resultText"] == "x" * 4096
+
+
+def test_output_json_applies_field_selection_and_truncation(client):
+    response = client.get("/result?fields=user_stories")
+    assert response.get_json() == {"user_stories": []}
+
+    response = client.get("/error?fields=error")
+    body = response.get_json()
+    assert response.status_code == 500
+    assert body["truncated_fields"] == ["stderr"]
+    assert len(body["stderr"]) < 10000
@@ -0,0 +1,106 @@
+import pytest
+
+from app_usage import UsageLedger
+
+NOW = 60 * 16_667  # the start of a 60 second bucket
+
+
+def make_record(job_id, key="key-a", repo="github.com/org/a", endpoint="plan", **cli):
+    return {
+        "job_id": job_id,
+        "api_key_fingerprint": key,
+        "repo": repo,
+        "endpoint": endpoint,
+        "status_code": 500 if not cli else 200,
+        "total_ms": 1000.0,
+        "phases_ms": {"entrypoint": 900.0, "parse": 10.0},
+        **cli,
+    }
+
+
+@pytest.fixture
+def ledger():
+    return UsageLedger(bucket_seconds=60, retention_seconds=3600, max_jobs=2)
+
+
+def test_query_sums_totals_and_averages_over_reporting_jobs(ledger):
+    ledger.record(make_record("j1", cost_usd=0.5, duration_ms=800), now=NOW)
+    ledger.record(make_record("j2", cost_usd=0.25, duration_ms=400), now=NOW + 10)
+    # A failed job reports no CLI fields
+    ledger.record(make_record("j3"), now=NOW + 20)
+
+    [group] = ledger.query(3600, group_by=(), now=NOW + 30)
+    assert group["jobs"] == 3
+    assert group["failures"] == 1
+    assert group["jobs_with_cli_usage"] == 2
+    assert group["cost_usd"] == 0.75
+    assert group["mean_duration_ms"] == 600.0
+    assert group["mean_total_ms"] == 1000.0
+    assert group["mean_entrypoint_ms"] == 900.0
+
+
+def test_means_are_none_without_reporting_jobs(ledger):
+    ledger.record(make_record("j1"), now=NOW)
+
+    [group] = ledger.query(3600, group_by=(), now=NOW)
+    assert group["jobs_with_cli_usage"] == 0
+    assert group["cost_usd"] == 0
+    assert group["mean_duration_ms"] is None
+    assert group["mean_duration_api_ms"] is None
+
+
+def test_window_includes_buckets_overlapping_its_start(ledger):
+    ledger.record(make_record("old", cost_usd=1.0), now=NOW)
+    ledger.record(make_record("new", cost_usd=2.0), now=NOW + 120)
+
+    # The old bucket ends at NOW + 60, after the window starts
+    [group] = ledger.query(150, group_by=(), now=NOW + 200)
+    assert group["cost_usd"] == 3.0
+
+    # Here the old bucket ends exactly where the window starts
+    [group] = ledger.query(140, group_by=(), now=NOW + 200)
+    assert group["cost_usd"] == 2.0
+
+
+def test_buckets_are_evicted_after_retention(ledger):
+    ledger.record(make_record("old", cost_usd=1.0), now=NOW)
+    ledger.record(make_record("new", key="key-b", cost_usd=2.0), now=NOW + 60 + 3600)
+
+    assert ("key-a", "github.com/org/a", "plan") not in ledger.buckets
+    groups = ledger.query(10**6, group_by=("api_key_fingerprint",), now=NOW + 3700)
+    assert [(g["api_key_fingerprint"], g["jobs"], g["cost_usd"]) for g in groups] == [
+        ("key-b", 1, 2.0)
+    ]
+
+
+def test_only_the_latest_job_records_are_kept(ledger):
+    for job_id in ("j1", "j2", "j3"):
+        ledger.record(make_record(job_id), now=NOW)
+
+    assert ledger.get_job("j1") is None
+    assert ledger.get_job("j3")["job_id"] == "j3"
+
+
+def test_filters_and_group_by(ledger):
+    ledger.record(make_record("j1", cost_usd=1.0), now=NOW)
+    ledger.record(make_record("j2", endpoint="act", cost_usd=2.0), now=NOW)
+    ledger.record(make_record("j3", key="key-b", cost_usd=4.0), now=NOW)
+
+    groups = ledger.query(3600, group_by=("endpoint",), now=NOW)
+    assert [(g["endpoint"], g["jobs"], g["cost_usd"]) for g in groups] == [
+        ("plan", 2, 5.0),
+        ("act", 1, 2.0),
+    ]
+
+    groups = ledger.query(
+        3600,
+        group_by=("endpoint",),
+        filters={"api_key_fingerprint": "key-a"},
+        now=NOW,
+    )
+    assert [(g["endpoint"], g["cost_usd"]) for g in groups] == [
+        ("act", 2.0),
+        ("plan", 1.0),
+    ]
+
+    assert ledger.query(3600, filters={"repo": "github.com/org/b"}, now=NOW) == []